@@ -24,6 +24,8 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public
 # License for more details.
 
+import itertools
+import operator
 import string
 
 from psycopg2 import extensions as ext
@@ -31,6 +33,34 @@ from psycopg2 import extensions as ext
 
 _formatter = string.Formatter()
 
+# Kinds of fields in a parsed SQL.format() template
+_FIELDS_POS = 1     # only positional fields: {}, {0}
+_FIELDS_NAME = 2    # only named fields: {name}
+_FIELDS_MIXED = 3   # both positional and named fields
+
+# Parsed templates, shared by the SQL objects wrapping the same string.
+# Only short strings are shared, the longer ones are only kept by their object.
+_parsed_cache = {}
+_PARSED_CACHE_MAX = 256
+_PARSED_CACHE_MAX_LEN = 64
+
+
+def _get_conn(context):
+    """Return the connection of a `!Composable.as_string()` context."""
+    # is it a connection or cursor?
+    if isinstance(context, ext.connection):
+        return context
+    elif isinstance(context, ext.cursor):
+        return context.connection
+    else:
+        raise TypeError("context must be a connection or a cursor")
+
+
+def _raise_not_composable(obj):
+    """Raise the error for an object found where a `Composable` is expected."""
+    raise TypeError(
+        f"Composed elements must be Composable, got {obj!r} instead")
+
 
 class Composable:
     """
@@ -46,6 +76,11 @@ class Composable:
     `!Composed` instance containing the left argument repeated as many times as
     requested.
     """
+    __slots__ = ('_wrapped',)
+
+    # True if as_string() returns the same value whatever the context
+    _const = False
+
     def __init__(self, wrapped):
         self._wrapped = wrapped
 
@@ -67,21 +102,24 @@ class Composable:
 
     def __add__(self, other):
         if isinstance(other, Composed):
-            return Composed([self]) + other
+            return Composed._from_trusted(
+                [self] + other._wrapped, self._const and other._const)
         if isinstance(other, Composable):
-            return Composed([self]) + Composed([other])
+            return Composed._from_trusted(
+                [self, other], self._const and other._const)
         else:
             return NotImplemented
 
     def __mul__(self, n):
-        return Composed([self] * n)
+        rv = Composed._from_trusted([self] * n, self._const)
+        if self._const:
+            # the context is not used to render a constant object
+            rv._const_str = self.as_string(None) * n
+        return rv
 
     def __eq__(self, other):
         return type(self) is type(other) and self._wrapped == other._wrapped
 
-    def __ne__(self, other):
-        return not self.__eq__(other)
-
 
 class Composed(Composable):
     """
@@ -101,15 +139,74 @@ class Composed(Composable):
     `!Composed` objects are iterable (so they can be used in `SQL.join` for
     instance).
     """
+    __slots__ = ('_const', '_const_str', '_sep')
+
     def __init__(self, seq):
-        wrapped = []
-        for i in seq:
+        wrapped = list(seq)
+        const = True
+        for i in wrapped:
             if not isinstance(i, Composable):
-                raise TypeError(
-                    f"Composed elements must be Composable, got {i!r} instead")
-            wrapped.append(i)
+                _raise_not_composable(i)
+            if const and not i._const:
+                const = False
 
         super().__init__(wrapped)
+        self._const = const
+        self._const_str = None
+        self._sep = None
+
+    @classmethod
+    def _from_trusted(cls, seq, const=None):
+        """
+        Create a `!Composed` from a list of `!Composable`, without checking it.
+
+        To be used internally only, where the objects are known to be valid.
+        The list is used as the object content, so it must not be modified.
+        If the caller already knows whether all the objects are constant it
+        can pass it as *const*, which saves a scan of *seq*.
+        """
+        # Same as __init__, with the attributes set inline: this function is
+        # called for every format(), join(), +, * and its cost adds up.
+        rv = cls.__new__(cls)
+        rv._wrapped = seq
+        rv._const = all(i._const for i in seq) if const is None else const
+        rv._const_str = None
+        rv._sep = None
+        return rv
+
+    @classmethod
+    def _from_join(cls, sep, items):
+        """
+        Create a `!Composed` interposing the `SQL` *sep* between *items*.
+
+        Same as `_from_trusted()`, but as_string() will use the separator
+        string to join the items, instead of rendering the *sep* objects.
+        """
+        seq = [sep] * (2 * len(items) - 1)
+        seq[::2] = items
+        # Joining the same object repeated is typically Placeholder() * n.
+        # Only the identity is checked: the items __eq__ may compare the
+        # wrapped user objects.
+        if items:
+            first = items[0]
+            repeated = all(map(operator.is_, items, itertools.repeat(first)))
+        else:
+            repeated = False
+
+        if repeated:
+            const = first._const
+        else:
+            const = all(i._const for i in items)
+
+        rv = cls._from_trusted(seq, const)
+        rv._sep = sep._wrapped
+
+        # A constant repeated object can be rendered by a single str.join()
+        if repeated and const:
+            rv._const_str = rv._sep.join(
+                [first.as_string(None)] * len(items))
+
+        return rv
 
     @property
     def seq(self):
@@ -117,19 +214,29 @@ class Composed(Composable):
         return list(self._wrapped)
 
     def as_string(self, context):
-        rv = []
-        for i in self._wrapped:
-            rv.append(i.as_string(context))
-        return ''.join(rv)
+        if self._const_str is not None:
+            return self._const_str
+
+        if self._sep is not None:
+            rv = self._sep.join(
+                [i.as_string(context) for i in self._wrapped[::2]])
+        else:
+            rv = ''.join([i.as_string(context) for i in self._wrapped])
+
+        if self._const:
+            self._const_str = rv
+        return rv
 
     def __iter__(self):
         return iter(self._wrapped)
 
     def __add__(self, other):
         if isinstance(other, Composed):
-            return Composed(self._wrapped + other._wrapped)
+            return Composed._from_trusted(
+                self._wrapped + other._wrapped, self._const and other._const)
         if isinstance(other, Composable):
-            return Composed(self._wrapped + [other])
+            return Composed._from_trusted(
+                self._wrapped + [other], self._const and other._const)
         else:
             return NotImplemented
 
@@ -178,10 +285,14 @@ class SQL(Composable):
         >>> print(query.as_string(conn))
         select "foo", "bar" from "table"
     """
+    __slots__ = ('_parsed',)
+    _const = True
+
     def __init__(self, string):
         if not isinstance(string, str):
             raise TypeError("SQL values must be strings")
         super().__init__(string)
+        self._parsed = None
 
     @property
     def string(self):
@@ -223,37 +334,109 @@ class SQL(Composable):
             select * from "people" where "id" = %s
 
         """
-        rv = []
+        mode, skeleton, fields = self._get_parsed()
+        rv = skeleton[:]
+        const = True    # the skeleton is only made of SQL
+        if mode != _FIELDS_MIXED:
+            values = args if mode == _FIELDS_POS else kwargs
+            for i, key in fields:
+                arg = rv[i] = values[key]
+                if not isinstance(arg, Composable):
+                    _raise_not_composable(arg)
+                if not arg._const:
+                    const = False
+        else:
+            for i, key in fields:
+                arg = rv[i] = args[key] if isinstance(key, int) else kwargs[key]
+                if not isinstance(arg, Composable):
+                    _raise_not_composable(arg)
+                if not arg._const:
+                    const = False
+
+        return Composed._from_trusted(rv, const)
+
+    def _get_parsed(self):
+        """
+        Return the template parsed as a (mode, skeleton, fields) tuple.
+
+        *skeleton* is the list of the `!SQL` objects of the template text,
+        with a `!None` where the fields go. *fields* is a list of (position,
+        key) pairs: the key is an int for the positional fields (auto-numbered
+        fields are already numbered), a str for the named ones. *mode* tells
+        whether the keys are all positional, all named, or mixed.
+
+        The template is parsed and validated by the first `format()` call and
+        the result is reused by the following ones, and by the other `!SQL`
+        objects with the same string (e.g. built again in a loop), if the
+        string is short enough.
+        """
+        if self._parsed is not None:
+            return self._parsed
+
+        shared = len(self._wrapped) <= _PARSED_CACHE_MAX_LEN
+        if shared:
+            rv = _parsed_cache.get(self._wrapped)
+            if rv is not None:
+                self._parsed = rv
+                return rv
+
+        chunks = []
         autonum = 0
         for pre, name, spec, conv in _formatter.parse(self._wrapped):
             if spec:
                 raise ValueError("no format specification supported by SQL")
             if conv:
                 raise ValueError("no format conversion supported by SQL")
-            if pre:
-                rv.append(SQL(pre))
+
+            # merge with a previous text-only chunk, e.g. split by a {{
+            if chunks and chunks[-1][1] is None:
+                pre = chunks.pop()[0] + pre
 
             if name is None:
-                continue
+                chunks.append((pre, None))
 
-            if name.isdigit():
+            elif name.isdigit():
                 if autonum:
                     raise ValueError(
                         "cannot switch from automatic field numbering to manual")
-                rv.append(args[int(name)])
+                chunks.append((pre, int(name)))
                 autonum = None
 
             elif not name:
                 if autonum is None:
                     raise ValueError(
                         "cannot switch from manual field numbering to automatic")
-                rv.append(args[autonum])
+                chunks.append((pre, autonum))
                 autonum += 1
 
             else:
-                rv.append(kwargs[name])
+                chunks.append((pre, name))
+
+        # The text between the fields is stored as SQL objects, shared by
+        # all the Composed returned by format().
+        skeleton = []
+        fields = []
+        for pre, key in chunks:
+            if pre:
+                skeleton.append(SQL(pre))
+            if key is not None:
+                fields.append((len(skeleton), key))
+                skeleton.append(None)
+
+        if all(isinstance(key, int) for i, key in fields):
+            mode = _FIELDS_POS
+        elif not any(isinstance(key, int) for i, key in fields):
+            mode = _FIELDS_NAME
+        else:
+            mode = _FIELDS_MIXED
 
-        return Composed(rv)
+        rv = self._parsed = (mode, skeleton, fields)
+
+        if shared:
+            if len(_parsed_cache) >= _PARSED_CACHE_MAX:
+                _parsed_cache.clear()
+            _parsed_cache[self._wrapped] = rv
+        return rv
 
     def join(self, seq):
         """
@@ -273,18 +456,12 @@ class SQL(Composable):
             >>> print(snip.as_string(conn))
             "foo", "bar", "baz"
         """
-        rv = []
-        it = iter(seq)
-        try:
-            rv.append(next(it))
-        except StopIteration:
-            pass
-        else:
-            for i in it:
-                rv.append(self)
-                rv.append(i)
+        seq = list(seq)
+        for i in seq:
+            if not isinstance(i, Composable):
+                _raise_not_composable(i)
 
-        return Composed(rv)
+        return Composed._from_join(self, seq)
 
 
 class Identifier(Composable):
@@ -318,6 +495,8 @@ class Identifier(Composable):
         select "table"."field" from "schema"."table"
 
     """
+    __slots__ = ('_cache',)
+
     def __init__(self, *strings):
         if not strings:
             raise TypeError("Identifier cannot be empty")
@@ -328,6 +507,9 @@ class Identifier(Composable):
 
         super().__init__(strings)
 
+        # (encoding, string) of the last rendering
+        self._cache = None
+
     @property
     def strings(self):
         """A tuple with the strings wrapped by the `Identifier`."""
@@ -347,7 +529,18 @@ class Identifier(Composable):
         return f"{self.__class__.__name__}({', '.join(map(repr, self._wrapped))})"
 
     def as_string(self, context):
-        return '.'.join(ext.quote_ident(s, context) for s in self._wrapped)
+        # The quoting only depends on the connection encoding, which is the
+        # same in the vast majority of the calls. A closed connection doesn't
+        # use the cache, so that quote_ident() raises InterfaceError.
+        conn = _get_conn(context)
+        encoding = conn.encoding
+        cache = self._cache
+        if cache is not None and cache[0] == encoding and not conn.closed:
+            return cache[1]
+
+        rv = '.'.join([ext.quote_ident(s, context) for s in self._wrapped])
+        self._cache = (encoding, rv)
+        return rv
 
 
 class Literal(Composable):
@@ -370,20 +563,15 @@ class Literal(Composable):
         'foo', 'ba''r', 42
 
     """
+    __slots__ = ()
+
     @property
     def wrapped(self):
         """The object wrapped by the `!Literal`."""
         return self._wrapped
 
     def as_string(self, context):
-        # is it a connection or cursor?
-        if isinstance(context, ext.connection):
-            conn = context
-        elif isinstance(context, ext.cursor):
-            conn = context.connection
-        else:
-            raise TypeError("context must be a connection or a cursor")
-
+        conn = _get_conn(context)
         a = ext.adapt(self._wrapped)
         if hasattr(a, 'prepare'):
             a.prepare(conn)
@@ -421,6 +609,8 @@ class Placeholder(Composable):
         insert into table ("foo", "bar", "baz") values (%(foo)s, %(bar)s, %(baz)s)
 
     """
+    __slots__ = ('_rendered',)
+    _const = True
 
     def __init__(self, name=None):
         if isinstance(name, str):
@@ -431,6 +621,7 @@ class Placeholder(Composable):
             raise TypeError(f"expected string or None as name, got {name!r}")
 
         super().__init__(name)
+        self._rendered = f"%({name})s" if name is not None else "%s"
 
     @property
     def name(self):
@@ -444,10 +635,7 @@ class Placeholder(Composable):
             return f"{self.__class__.__name__}({self._wrapped!r})"
 
     def as_string(self, context):
-        if self._wrapped is not None:
-            return f"%({self._wrapped})s"
-        else:
-            return "%s"
+        return self._rendered
 
 
 # Literals
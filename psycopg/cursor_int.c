@@ -90,16 +90,13 @@ RAISES_NEG static int
 _curs_is_composible(PyObject *obj)
 {
     int rv = -1;
-    PyObject *m = NULL;
     PyObject *comp = NULL;
 
-    if (!(m = PyImport_ImportModule("psycopg2.sql"))) { goto exit; }
-    if (!(comp = PyObject_GetAttrString(m, "Composable"))) { goto exit; }
+    if (!(comp = psyco_get_composable_type())) { goto exit; }
     rv = PyObject_IsInstance(obj, comp);
 
 exit:
     Py_XDECREF(comp);
-    Py_XDECREF(m);
     return rv;
 
 }
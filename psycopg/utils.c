@@ -454,3 +454,44 @@ psyco_get_decimal_type(void)
 
     return decimalType;
 }
+
+/* psyco_get_composable_type
+
+   Return a new reference to the psycopg2.sql.Composable type.
+
+   The object is cached as in psyco_get_decimal_type(): it is looked up for
+   every query passed to execute() as a Composable.
+*/
+
+PyObject *
+psyco_get_composable_type(void)
+{
+    static PyObject *cachedType = NULL;
+    PyObject *composableType = NULL;
+    PyObject *sql;
+
+    /* Use the cached object if running from the main interpreter. */
+    int can_cache = psyco_is_main_interp();
+    if (can_cache && cachedType) {
+        Py_INCREF(cachedType);
+        return cachedType;
+    }
+
+    /* Get a new reference to the Composable type. */
+    sql = PyImport_ImportModule("psycopg2.sql");
+    if (sql) {
+        composableType = PyObject_GetAttrString(sql, "Composable");
+        Py_DECREF(sql);
+    }
+    else {
+        composableType = NULL;
+    }
+
+    /* Store the object from future uses. */
+    if (can_cache && !cachedType && composableType) {
+        Py_INCREF(composableType);
+        cachedType = composableType;
+    }
+
+    return composableType;
+}
@@ -58,6 +58,7 @@ HIDDEN RAISES BORROWED PyObject *psyco_set_error(
     PyObject *exc, cursorObject *curs, const char *msg);
 
 HIDDEN PyObject *psyco_get_decimal_type(void);
+HIDDEN PyObject *psyco_get_composable_type(void);
 
 HIDDEN PyObject *Bytes_Format(PyObject *format, PyObject *args);
 
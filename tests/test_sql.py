@@ -61,6 +61,17 @@ class SqlFormatTests(ConnectingTestCase):
         self.assert_(isinstance(s1, str))
         self.assertEqual(s1, 'select "field" from "table"')
 
+    def test_pos_and_dict(self):
+        s = sql.SQL("select {0} from {t} where {1}").format(
+            sql.Identifier('field'), sql.SQL('true'), t=sql.Identifier('table'))
+        self.assertEqual(s.seq, [sql.SQL('select '), sql.Identifier('field'),
+            sql.SQL(' from '), sql.Identifier('table'),
+            sql.SQL(' where '), sql.SQL('true')])
+        self.assertRaises(IndexError,
+            sql.SQL("select {0} from {t}").format, t=sql.Identifier('table'))
+        self.assertRaises(KeyError,
+            sql.SQL("select {0} from {t}").format, sql.Identifier('field'))
+
     def test_compose_literal(self):
         s = sql.SQL("select {0};").format(sql.Literal(dt.date(2016, 12, 31)))
         s1 = s.as_string(self.conn)
@@ -82,6 +93,12 @@ class SqlFormatTests(ConnectingTestCase):
         s = sql.SQL("{{1,{0}}}").format(sql.Literal(7))
         self.assertEqual(s.as_string(self.conn), "{1,7}")
 
+    def test_braces_escape_seq(self):
+        s = sql.SQL("{{1,{0}}}").format(sql.Literal(7))
+        self.assertEqual(s.seq, [sql.SQL("{1,"), sql.Literal(7), sql.SQL("}")])
+        s = sql.SQL("select {{}} from {{x}};").format()
+        self.assertEqual(s.seq, [sql.SQL("select {} from {x};")])
+
     def test_compose_badnargs(self):
         self.assertRaises(IndexError, sql.SQL("select {0};").format)
 
@@ -102,6 +119,37 @@ class SqlFormatTests(ConnectingTestCase):
         self.assertRaises(ValueError, sql.SQL("select {a!r};").format, a=10)
         self.assertRaises(ValueError, sql.SQL("select {a:<};").format, a=10)
 
+    def test_reuse_template(self):
+        tmpl = sql.SQL("select {} from {}")
+        s = tmpl.format(sql.Identifier('f1'), sql.Identifier('t1'))
+        self.assertEqual(s.as_string(self.conn), 'select "f1" from "t1"')
+        s = tmpl.format(sql.Identifier('f2'), sql.Identifier('t2'))
+        self.assertEqual(s.as_string(self.conn), 'select "f2" from "t2"')
+        self.assertRaises(IndexError, tmpl.format, sql.Identifier('f3'))
+
+        tmpl = sql.SQL("select {a!r};")
+        self.assertRaises(ValueError, tmpl.format, a=10)
+        self.assertRaises(ValueError, tmpl.format, a=10)
+
+    def test_share_template(self):
+        s1 = sql.SQL("select {} from {}")
+        s2 = sql.SQL("select {} from {}")
+        self.assertEqual(
+            s1.format(sql.Identifier('f1'), sql.Identifier('t1'))
+            .as_string(self.conn), 'select "f1" from "t1"')
+        self.assertEqual(
+            s2.format(sql.Identifier('f2'), sql.Identifier('t2'))
+            .as_string(self.conn), 'select "f2" from "t2"')
+        self.assert_(s1._get_parsed() is s2._get_parsed())
+
+        # long templates are not shared, but still parsed once
+        s1 = sql.SQL("select {} from {} " + "x" * 100)
+        s2 = sql.SQL("select {} from {} " + "x" * 100)
+        s1.format(sql.Identifier('f1'), sql.Identifier('t1'))
+        s2.format(sql.Identifier('f1'), sql.Identifier('t1'))
+        self.assert_(s1._get_parsed() is s1._get_parsed())
+        self.assert_(s1._get_parsed() is not s2._get_parsed())
+
     def test_must_be_adaptable(self):
         class Foo:
             pass
@@ -213,6 +261,23 @@ class IdentifierTests(ConnectingTestCase):
         self.assertEqual(
             sql.Identifier("fo'o", 'ba"r').as_string(self.conn), '"fo\'o"."ba""r"')
 
+    def test_as_str_reuse(self):
+        obj = sql.Identifier('foo', 'b\u00e0r')
+        self.assertEqual(obj.as_string(self.conn), '"foo"."b\u00e0r"')
+        self.assertEqual(obj.as_string(self.conn.cursor()), '"foo"."b\u00e0r"')
+        self.conn.set_client_encoding('latin1')
+        self.assertEqual(obj.as_string(self.conn), '"foo"."b\u00e0r"')
+        self.assertRaises(TypeError, obj.as_string, None)
+
+    def test_as_str_closed(self):
+        conn = self.connect()
+        cur = conn.cursor()
+        obj = sql.Identifier('foo')
+        self.assertEqual(obj.as_string(conn), '"foo"')
+        conn.close()
+        self.assertRaises(psycopg2.InterfaceError, obj.as_string, conn)
+        self.assertRaises(psycopg2.InterfaceError, obj.as_string, cur)
+
     def test_join(self):
         self.assert_(not hasattr(sql.Identifier('foo'), 'join'))
 
@@ -309,6 +374,25 @@ class SQLTests(ConnectingTestCase):
         obj = sql.SQL(", ").join([])
         self.assertEqual(obj, sql.Composed([]))
 
+    def test_join_no_items_eq(self):
+        class Foo:
+            def __eq__(self, other):
+                raise Exception("__eq__ called")
+
+        obj = sql.SQL(", ").join([sql.Literal(Foo()), sql.Literal(Foo())])
+        self.assert_(isinstance(obj, sql.Composed))
+        self.assertEqual(len(obj.seq), 3)
+
+    def test_join_equal_placeholders(self):
+        obj = sql.SQL(", ").join([sql.Placeholder(), sql.Placeholder()])
+        self.assertEqual(obj.as_string(self.conn), "%s, %s")
+        obj = sql.SQL(", ").join([sql.Placeholder('a'), sql.Placeholder('a')])
+        self.assertEqual(obj.as_string(self.conn), "%(a)s, %(a)s")
+
+    def test_join_must_be_composable(self):
+        self.assertRaises(TypeError, sql.SQL(", ").join, ['foo'])
+        self.assertRaises(TypeError, sql.SQL(", ").join, [sql.SQL('foo'), 10])
+
 
 class ComposedTest(ConnectingTestCase):
     def test_class(self):
@@ -354,6 +438,12 @@ class ComposedTest(ConnectingTestCase):
         self.assert_(isinstance(obj, sql.Composed))
         self.assertQuotedEqual(obj.as_string(self.conn), "foo 'bar'")
 
+    def test_as_string_const(self):
+        obj = sql.Composed([sql.SQL("foo "), sql.Placeholder(),
+            sql.Composed([sql.SQL(" bar "), sql.Placeholder('baz')])])
+        self.assertEqual(obj.as_string(self.conn), "foo %s bar %(baz)s")
+        self.assertEqual(obj.as_string(self.conn), "foo %s bar %(baz)s")
+
     def test_iter(self):
         obj = sql.Composed([sql.SQL("foo"), sql.SQL('bar')])
         it = iter(obj)
@@ -385,6 +475,13 @@ class PlaceholderTest(ConnectingTestCase):
     def test_bad_name(self):
         self.assertRaises(ValueError, sql.Placeholder, ')')
 
+    def test_multiply(self):
+        obj = sql.Placeholder() * 3
+        self.assert_(isinstance(obj, sql.Composed))
+        self.assertEqual(obj.seq, [sql.Placeholder()] * 3)
+        self.assertEqual(obj.as_string(self.conn), '%s%s%s')
+        self.assertEqual(obj.join(', ').as_string(self.conn), '%s, %s, %s')
+
     def test_eq(self):
         self.assertEqual(sql.Placeholder('foo'), sql.Placeholder('foo'))
         self.assertNotEqual(sql.Placeholder('foo'), sql.Placeholder('bar'))